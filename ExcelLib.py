@@ -6,29 +6,54 @@ Available methods are the followings:
 [4] CellStyle (Class)
 [5] CopySheet
 [6] get_filepaths
+[7] iter_filepaths
+[8] save_fast
+[9] save_workbook
+
+Workbooks are serialized much faster when lxml is installed, which
+openpyxl picks up automatically (pip install lxml).
 
 Authors: Danusorn Sitdhirasdr <danusorn.si@gmail.com>
 versionadded:: 11-07-2023
 
 '''
-import pandas as pd, numpy as np, os
+import pandas as pd, os, warnings
+from io import BytesIO
 from datetime import datetime, timedelta
 from openpyxl import load_workbook, Workbook
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.styles import (PatternFill, Border, Side, 
-                             Alignment, Font, Protection)
+                             Alignment, Font, Protection, NamedStyle)
 from openpyxl.worksheet.protection import SheetProtection
-from openpyxl.formatting.rule import FormulaRule
 from openpyxl.formatting import Rule
+from openpyxl.styles.differential import DifferentialStyle
 from openpyxl.utils import get_column_letter
-from itertools import product
+from openpyxl.worksheet.cell_range import CellRange
+from weakref import WeakKeyDictionary
+from copy import copy
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl.xml import LXML
+
+if not LXML:
+    warnings.warn("lxml is not installed, openpyxl falls back to the "
+                  "slower pure-Python XML writer.")
 
 __all__ = ["AutoFilter",
            "ProtectSheet", 
            "Validation",
            "CellStyle", 
            "CopySheet", 
-           "get_filepaths"]
+           "get_filepaths", 
+           "iter_filepaths", 
+           "save_fast", 
+           "save_workbook"]
+
+# Cached column letter e.g. 1 is "A"
+ColumnLetter = lru_cache(maxsize=None)(get_column_letter)
+
+# Cell protections (immutable) shared by all cells
+LOCKED, UNLOCKED = Protection(locked=True), Protection(locked=False)
 
 class Validation:
     
@@ -80,6 +105,12 @@ class Validation:
         validation-to-cells-29fecbcc-d1b9-42c1-9d76-eff3ce5f7249
         
     '''
+    # Data-validation objects shared by identical settings
+    cache = dict()
+    
+    # Data-validation objects added to each worksheet (by settings)
+    sheets = WeakKeyDictionary()
+    
     def __init__(self, type=None, operator=None, formula1=None, 
                  formula2=None, allow_blank=True, kwargs=None):
         
@@ -95,12 +126,20 @@ class Validation:
             formula1 = round(FindDiff(*((formula1,) + self.input[type])), 15)
             formula2 = round(FindDiff(*((formula2,) + self.input[type])), 15)
         elif type=="list": 
-            formula1 = formula1[:255].lstrip().rstrip()
-            formula1 =f'"{formula1}"'
+            formula1 = ListFormula(formula1)
+            if formula1 is None: type = None # no list i.e. any value
         elif type=="custom":
             formula1 =f'"{formula1}"'
         else: pass
         
+        # Reuse data validation with the same settings
+        kwargs = kwargs if isinstance(kwargs, dict) else dict()
+        self.key = (type, operator, formula1, formula2, 
+                    allow_blank, frozenset(kwargs.items()))
+        if self.key in self.cache: 
+            self.dv = self.cache[self.key]
+            return None
+        
         # Create data validation
         self.dv = DataValidation(type=type, 
                                  operator=operator,
@@ -109,9 +148,9 @@ class Validation:
                                  allow_blank=allow_blank)
             
         # Optionally set a custom message
-        if isinstance(kwargs, dict):
-            for key in kwargs.keys():
-                setattr(self.dv, key, kwargs[key])
+        for key in kwargs.keys():
+            setattr(self.dv, key, kwargs[key])
+        self.cache[self.key] = self.dv
 
     def apply(self, sh, coord=(1,1), offset=(0,0)):
         
@@ -130,19 +169,58 @@ class Validation:
             The number of rows, and columns to be added.
             
         '''
-        # Add the data-validation object to designated cell
-        cell0 = sh.cell(*coord).coordinate
-        cell1 = sh.cell(coord[0] + max(offset[0], 0), 
-                        coord[1] + max(offset[1], 0)).coordinate
+        self.apply_many(sh, [(coord, offset)])
+        
+    def apply_many(self, sh, ranges):
+        
+        '''
+        Transform multiple ranges according to validation format. All
+        ranges are merged into data-validation object at once.
+        
+        Parameters
+        ----------
+        sh : openpyxl Worksheet
+            Excel worksheet.
+
+        ranges : list of ((int,int), (int,int))
+            List of starting cell coordinate ("coord") and offset e.g.
+            [((1,1), (0,2)), ((5,1), (3,0))] is "A1:C1" and "A5:A8".
+            
+        '''
+        # Add new ranges to previously added range(s) in place
+        dv = self.__dv__(sh)
+        for (r0, c0), offset in ranges:
+            r1, c1 = r0 + max(offset[0], 0), c0 + max(offset[1], 0)
+            dv.sqref.add(CellRange(min_col=c0, min_row=r0, 
+                                   max_col=c1, max_row=r1))
+        
+    def __dv__(self, sh):
         
-        # Remove previously added range(s)
-        while len(self.dv.ranges.ranges):
-            rng = self.dv.ranges.ranges[0].__str__()
-            self.dv.ranges.remove(rng)
+        '''
+        Data-validation object of worksheet. It is created and added 
+        to worksheet only once per settings, so that ranges from all
+        Validations with the same settings are merged, while ranges 
+        of other worksheets are kept separately.
+        '''
+        dvs = self.sheets.setdefault(sh, dict())
+        if self.key not in dvs:
+            dvs[self.key] = copy(self.dv)
+            sh.add_data_validation(dvs[self.key])
+        return dvs[self.key]
+    
+    def reset_ranges(self):
         
-        # Add new range
-        self.dv.add(f"{cell0}:{cell1}")
-        sh.add_data_validation(self.dv)
+        '''
+        Remove all ranges that have been applied i.e. data-validation 
+        object is removed from every worksheet. Since it is shared by 
+        all Validations with the same settings, ranges applied by those 
+        Validations are also removed.
+        '''
+        for sh, dvs in list(self.sheets.items()):
+            dv = dvs.pop(self.key, None)
+            if dv is not None:
+                sh.data_validations.dataValidation = \
+                [v for v in sh.data_validations.dataValidation if v is not dv]
 
 def FindDiff(dt0, dt1, dtformat, attr, factor=1):
     '''Find absolute difference between dt0 and dt1'''
@@ -153,18 +231,60 @@ def FindDiff(dt0, dt1, dtformat, attr, factor=1):
         except: return None
     else: return None
 
+def ListFormula(source, length=255):
+    
+    '''
+    Quoted comma-separated list e.g. '"a,b,c"', whose length (incl.
+    quotes) does not exceed Excel's limit. Items that do not fit are 
+    dropped as a whole. If source is missing (None or NaN), it returns 
+    None (no list), and if the first item alone does not fit, it raises 
+    ValueError.
+    
+    Examples
+    --------
+    >>> ListFormula("a, b,c")
+    '"a,b,c"'
+    >>> ListFormula("aa,bb,cc", length=7)
+    '"aa,bb"'
+    >>> ListFormula(None) is None, ListFormula(float("nan")) is None
+    (True, True)
+    >>> ListFormula("abcdef", length=7)
+    Traceback (most recent call last):
+    ...
+    ValueError: List item 'abcdef' exceeds 5 characters.
+    
+    '''
+    if source is None or (isinstance(source, float) and source != source): 
+        return None
+    items, n = [], 2
+    for item in [t.strip() for t in str(source).split(",")]:
+        n += len(item) + (1 if len(items) else 0)
+        if n > length: break
+        items.append(item)
+    if len(items)==0:
+        raise ValueError(f"List item {item!r} exceeds {length-2} characters.")
+    return '"{}"'.format(",".join(items))
+
 def UpdateDict(dict1:dict, dict2:dict):
     '''Update dictionary'''
-    if isinstance(dict1, dict) & isinstance(dict2, dict):
-        for key in set(dict1.keys()).intersection(dict2.keys()):
-            dict1[key] = dict2[key]
+    if not (isinstance(dict1, dict) and isinstance(dict2, dict)):
+        return dict1
+    for key in dict2:
+        if key in dict1: dict1[key] = dict2[key]
     return dict1
 
-def CreateCoords(coord=(1,1), offset=(0,0)):
-    '''Create coordinates'''
-    stop = tuple(np.r_[coord] + offset + (1,1))
-    return list(product(range(coord[0], stop[0]),
-                        range(coord[1], stop[1])))
+def ToARGB(color):
+    '''
+    Convert 6-digit RGB hex to 8-digit aRGB (opaque). Otherwise, 
+    openpyxl prefixes "00" i.e. fully transparent.
+    '''
+    if isinstance(color, str) and (len(color)==6): return "FF" + color
+    else: return color
+
+def RowValues(sh, row=1):
+    '''Values of a row e.g. column labels (no Cell objects are kept)'''
+    return list(next(sh.iter_rows(min_row=row, max_row=row, 
+                                  values_only=True), ()))
 
 class CellStyle:
     
@@ -181,13 +301,36 @@ class CellStyle:
         - Border e.g. "left", "right", whose value must be 
           "openpyxl.styles.Side(border_style, color)"
     
+    Notes
+    -----
+    Once registered with a workbook (see `register`), the style is
+    assigned by name, which sets all properties with a single lookup. 
+    A named style also sets number format and protection i.e. 
+    "General" and locked.
+    
     References
     ----------
     [1] https://openpyxl.readthedocs.io/en/stable/styles.html
     
     '''
+    # Color parameters (aRGB)
+    colors = {"color", "start_color", "end_color"}
+    
+    # Style objects (immutable) shared by identical parameters
+    cache = dict()
+    
     def __init__(self, kwargs=None):
         
+        # Reuse style objects created from the same parameters
+        self.name = None
+        kwargs = dict() if kwargs is None else kwargs
+        try: key = frozenset(kwargs.items()) 
+        except TypeError: key = None
+        if key in self.cache:
+            (self.fontstyle, self.fillstyle, 
+             self.alignment, self.borderstyle) = self.cache[key]
+            return None
+        
         # Default properties
         # underline = {'single', 'double', 
         #              'doubleAccounting', 
@@ -199,11 +342,11 @@ class CellStyle:
                               vertAlign=None, 
                               underline='none', 
                               strike=False, 
-                              color='404040')
+                              color='FF404040')
 
         self.fillstyle = dict(fill_type="none", 
-                              start_color='000000', 
-                              end_color='000000', 
+                              start_color='FF000000', 
+                              end_color='FF000000', 
                               patternType='none')
         
         self.alignment = dict(horizontal='general',
@@ -215,7 +358,7 @@ class CellStyle:
         
         # vertical and horizontal are excluded
         # same parameters as "alignment"
-        sidestyle = Side(border_style=None, color='000000')
+        sidestyle = Side(border_style=None, color='FF000000')
         self.borderstyle = dict(left=sidestyle,
                                 right=sidestyle,
                                 top=sidestyle,
@@ -224,11 +367,51 @@ class CellStyle:
                                 diagonal_direction=0,
                                 outline=sidestyle)
         
-        kwargs = dict() if kwargs is None else kwargs
-        self.fontstyle = Font(**UpdateDict(self.fontstyle, kwargs))
-        self.fillstyle = PatternFill(**UpdateDict(self.fillstyle, kwargs))
-        self.alignment = Alignment(**UpdateDict(self.alignment, kwargs))
-        self.borderstyle = Border(**UpdateDict(self.borderstyle, kwargs))
+        # Update default properties (if any)
+        if len(kwargs):
+            kwargs = {k: (ToARGB(v) if k in self.colors else v) 
+                      for k,v in kwargs.items()}
+            for style in (self.fontstyle, self.fillstyle, 
+                          self.alignment, self.borderstyle):
+                UpdateDict(style, kwargs)
+        
+        self.fontstyle = Font(**self.fontstyle)
+        self.fillstyle = PatternFill(**self.fillstyle)
+        self.alignment = Alignment(**self.alignment)
+        self.borderstyle = Border(**self.borderstyle)
+        if key is not None:
+            self.cache[key] = (self.fontstyle, self.fillstyle, 
+                               self.alignment, self.borderstyle)
+    
+    def register(self, wb, name):
+        
+        '''
+        Register format as named style in workbook.
+        
+        Parameters
+        ----------
+        wb : openpyxl Workbook
+            Workbook.
+        
+        name : str
+            Name of style. If it already exists in workbook, the 
+            existing style is used only when its font, fill, alignment, 
+            and border are the same, otherwise it raises ValueError.
+            
+        '''
+        style = NamedStyle(name=name, font=self.fontstyle, 
+                           fill=self.fillstyle, alignment=self.alignment, 
+                           border=self.borderstyle)
+        if name not in wb.named_styles: 
+            wb.add_named_style(style)
+        else:
+            exist = wb._named_styles[name]
+            attrs = ("font", "fill", "alignment", "border")
+            if any(getattr(exist, a) != getattr(style, a) for a in attrs):
+                raise ValueError(f"Named style <{name}> already exists in "
+                                 f"workbook with different format.")
+        self.name = name
+        return self
     
     def apply(self, sh, coord=(1,1), offset=(0,0)):
         
@@ -247,12 +430,40 @@ class CellStyle:
             The number of rows, and columns to be added.
             
         '''
-        for cell in CreateCoords(coord, offset):
-            addr = sh.cell(*cell).coordinate
-            sh[addr].font = self.fontstyle
-            sh[addr].fill = self.fillstyle
-            sh[addr].alignment = self.alignment
-            sh[addr].border = self.borderstyle
+        self.apply_many(sh, [(coord, offset)])
+        
+    def apply_many(self, sh, ranges):
+        
+        '''
+        Apply predefined format to multiple ranges.
+        
+        Parameters
+        ----------
+        sh : openpyxl Worksheet
+            Excel worksheet.
+
+        ranges : list of ((int,int), (int,int))
+            List of starting cell coordinate ("coord") and offset e.g.
+            [((1,1), (0,2)), ((5,1), (3,0))] is "A1:C1" and "A5:A8".
+            
+        '''
+        # Bind style objects to locals before looping over cells
+        font, fill = self.fontstyle, self.fillstyle
+        align, border = self.alignment, self.borderstyle
+        name = self.name if self.name in sh.parent.named_styles else None
+        for (r0, c0), offset in ranges:
+            r1, c1 = r0 + offset[0], c0 + offset[1]
+            if (r1 < r0) or (c1 < c0): continue
+            for row in sh.iter_rows(min_row=r0, max_row=r1, 
+                                    min_col=c0, max_col=c1):
+                for cell in row:
+                    if name is not None: 
+                        cell.style = name
+                    else:
+                        cell.font = font
+                        cell.fill = fill
+                        cell.alignment = align
+                        cell.border = border
 
 def AutoFilter(sh, header=1, start=1, end=None):
     
@@ -275,12 +486,12 @@ def AutoFilter(sh, header=1, start=1, end=None):
         used column range (max_column)
         
     '''
-    start = int(np.fmax(1, start))
+    start = max(1, int(start))
     end = end if isinstance(end,int) else sh.max_column
-    end = int(np.fmax(np.fmin(end, sh.max_column), start))
+    end = max(min(end, sh.max_column), start)
     filters = sh.auto_filter
-    filters.ref = "{}{}:{}{}".format(get_column_letter(start), header,
-                                     get_column_letter(end), sh.max_row)
+    filters.ref = "{}{}:{}{}".format(ColumnLetter(start), header,
+                                     ColumnLetter(end), sh.max_row)
 
 def ProtectSheet(sh, labels=None, header=1, password="admin", protect=True):
     
@@ -306,22 +517,32 @@ def ProtectSheet(sh, labels=None, header=1, password="admin", protect=True):
         If False, it protects all columns not in list. If True, it 
         protects all columns from the list.
         
+    Notes
+    -----
+    When all columns are to be protected, cells are left untouched 
+    as Excel locks every cell by default, which saves looping over 
+    the whole worksheet. Cells, whose protection is explicitly set
+    to unlocked, remain unlocked.
+        
     '''
     # Protected columns
-    columns = [c.value for c in sh[str(header)]]
-    labels = columns if labels is None else labels
-    if protect==False: 
-        labels = list(set(columns).difference(labels))
+    columns = RowValues(sh, header)
+    labels = set(columns if labels is None else labels)
+    if protect==False: labels = set(columns).difference(labels)
+    locked_cols = {c for c,col in enumerate(columns,1) if col in labels}
 
     # Protect worksheet
     sh.protection.sheet = False
     
-    # Protect / Unprotect columns
-    for c,col in enumerate(columns,1):
-        locked = True if col in labels else False
-        sh.cell(1,c).protection = Protection(locked=True)
-        for r in range(header + 1, sh.max_row+1):
-            sh.cell(r,c).protection = Protection(locked=locked)
+    # Protect / Unprotect columns (protection objects are shared)
+    # Cells are locked by default when all columns are protected
+    if len(locked_cols) < len(columns):
+        for cell in sh[1][:len(columns)]: cell.protection = LOCKED
+        for row in sh.iter_rows(min_row=header + 1, max_row=sh.max_row, 
+                                min_col=1, max_col=len(columns)):
+            for cell in row:
+                cell.protection = (LOCKED if cell.column in locked_cols 
+                                   else UNLOCKED)
     
     # Protect sheet
     sh.protection = SheetProtection(sh, 
@@ -336,7 +557,8 @@ def ProtectSheet(sh, labels=None, header=1, password="admin", protect=True):
     # Save and close workbook
     sh.sheet_view.showGridLines = False
 
-def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None):
+def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None, 
+              write_only=False):
     
     '''
     Copy worksheet to new worksheet.
@@ -344,7 +566,9 @@ def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None):
     Parameters
     ----------
     wb : openpyxl Workbook
-        Workbook.
+        Workbook. It can be loaded in read-only mode i.e. 
+        load_workbook(filename, read_only=True), which streams rows
+        from the source worksheet.
         
     sheetname : str
         Name of worksheet to be copied.
@@ -354,7 +578,15 @@ def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None):
         defaults to "NEW_%Y%m%d%H%M%S".
         
     new_wb : openpyxl Workbook
-        New workbook. If None, it uses current workbook ("wb").
+        New workbook. If None, it uses current workbook ("wb") or a 
+        new workbook when "wb" is read-only.
+    
+    write_only : bool, default=False
+        If True and "new_wb" is None, rows are streamed to a new 
+        write-only workbook i.e. Workbook(write_only=True), which 
+        keeps memory nearly constant for large worksheets. Only 
+        values are copied (styles and merged cells are not) and
+        the new workbook can only be saved once.
         
     References
     ----------
@@ -369,6 +601,11 @@ def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None):
     # Initiate parameters
     def_name = f"NEW_{datetime.now():%Y%m%d%H%M%S}"
     sh = wb[sheetname]
+    if (new_wb is None) and write_only: 
+        new_wb = Workbook(write_only=True)
+    elif (new_wb is None) and wb.read_only:
+        new_wb = Workbook()
+        new_wb.remove(new_wb.active)
     new_wb = wb if new_wb is None else new_wb
     if ((new_sheetname is None) or 
         (new_sheetname in new_wb.sheetnames)): 
@@ -376,19 +613,18 @@ def CopySheet(wb, sheetname, new_sheetname=None, new_wb=None):
     new_sh = new_wb.create_sheet(new_sheetname, 0)
 
     # copying the cell values from source 
-    # excel file to destination excel file
-    for i in range (1, sh.max_row + 1):
-        for j in range (1, sh.max_column + 1):
-            # writing the read value to destination excel file
-            new_sh.cell(i,j).value = sh.cell(i, j).value
+    # excel file to destination excel file (row by row)
+    for row in sh.iter_rows(min_row=1, max_row=sh.max_row, 
+                            min_col=1, max_col=sh.max_column, 
+                            values_only=True):
+        new_sh.append(row)
 
     return new_wb
 
 def GetCellRange(sh, coord=(1,1), offset=(0,0)):
     '''Return address of cell range'''
-    start = sh.cell(*coord).coordinate
-    stop = tuple(np.r_[coord] + offset)
-    stop = sh.cell(*stop).coordinate
+    start = f"{ColumnLetter(coord[1])}{coord[0]}"
+    stop = f"{ColumnLetter(coord[1] + offset[1])}{coord[0] + offset[0]}"
     return start, stop
 
 class Formulaformat(CellStyle):
@@ -418,6 +654,9 @@ class Formulaformat(CellStyle):
         self.params = {"font"   : self.pattern.fontstyle, 
                        "fill"   : self.pattern.fillstyle, 
                        "border" : self.pattern.borderstyle}
+        
+        # Differential style is shared by all rules (see FormulaRule)
+        self.dxf = DifferentialStyle(**self.params)
 
     def apply(self, sh, coord=(1,1), offset=(0,0), formula=None):
         
@@ -441,11 +680,11 @@ class Formulaformat(CellStyle):
         '''
         addr = GetCellRange(sh, coord, offset)
         if formula is None: formula = f'ISBLANK({addr[0]})'
-        rule = FormulaRule(formula=[formula], 
-                           stopIfTrue=True, **self.params)
+        rule = Rule(type="expression", formula=[formula], 
+                    stopIfTrue=True, dxf=self.dxf)
         sh.conditional_formatting.add(":".join(addr), rule)
 
-def get_filepaths(path=None):
+def get_filepaths(path=None, max_workers=None):
     
     '''
     Find all file directories, which are scanned from top-down. 
@@ -455,6 +694,12 @@ def get_filepaths(path=None):
     path : str, default=None
         Root directory. If None, it defaults to current working 
         directory i.e. os.getcwd().
+        
+    max_workers : int, default=None
+        Number of threads that retrieve file sizes concurrently (I/O 
+        bound e.g. network drive). If None, it defaults to 
+        min(32, os.cpu_count() * 4). If 1, files are scanned in a 
+        single thread.
     
     Returns
     -------
@@ -466,10 +711,132 @@ def get_filepaths(path=None):
     
     '''
     if path is None: path = os.getcwd()
-    foundfiles = dict()
-    for root, dirs, files in os.walk(path, topdown=True):
-        for name in files:
-            filename = os.path.join(root,name)
-            foundfiles[name] ={"path" : filename, 
-                               "size" : os.path.getsize(filename)}
-    return foundfiles
\ No newline at end of file
+    if max_workers is None: max_workers = min(32, (os.cpu_count() or 1) * 4)
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            files = [f for f in executor.map(FileStat, ScanFiles(path)) 
+                     if f is not None]
+    else: files = iter_filepaths(path)
+    return {name : {"path" : filepath, "size" : size} 
+            for name, filepath, size in files}
+
+def iter_filepaths(path=None):
+    
+    '''
+    Generate file directories one at a time, which are scanned from 
+    top-down (see get_filepaths).
+    
+    Parameters
+    ----------
+    path : str, default=None
+        Root directory. If None, it defaults to current working 
+        directory i.e. os.getcwd().
+    
+    Yields
+    ------
+    (name, path, size) : (str, str, int)
+        e.g. ("file1.xlsx", "C:\\file1.xlsx", 50000)
+    
+    '''
+    if path is None: path = os.getcwd()
+    for entry in ScanFiles(path): 
+        if (f:=FileStat(entry)) is not None: yield f
+
+def FileStat(entry):
+    '''
+    Return name, path, and size of file entry (os.DirEntry), or None 
+    if it cannot be accessed (e.g. deleted while scanning)
+    '''
+    try: return entry.name, entry.path, entry.stat().st_size
+    except OSError: return None
+
+def ScanFiles(path):
+    '''
+    Yield file entries (os.DirEntry) from top-down. Directories that 
+    cannot be read are skipped (as os.walk does).
+    '''
+    subdirs = []
+    try: entries = os.scandir(path)
+    except OSError: return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False): subdirs.append(entry)
+            elif entry.is_file(): yield entry
+    for entry in subdirs: yield from ScanFiles(entry.path)
+
+def save_fast(df, path, money_cols=None, header=True):
+    
+    '''
+    Write DataFrame to Excel file with "xlsxwriter" engine, which 
+    writes XML directly without building cells in memory (faster 
+    than "openpyxl" for large DataFrame). Each format is created 
+    once and applied to whole column.
+    
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame to be written.
+        
+    path : str
+        A valid file path e.g. "C:\\Folder\\example.xlsx".
+    
+    money_cols : list of str, default=None
+        List of column labels to be formatted as "$#,##0".
+        
+    header : bool, default=True
+        If True, column labels are written and the first row is 
+        frozen.
+    
+    References
+    ----------
+    [1] https://xlsxwriter.readthedocs.io/working_with_pandas.html
+    
+    '''
+    with pd.ExcelWriter(path, engine="xlsxwriter", 
+                        datetime_format="yyyy-mm-dd") as writer:
+        df.to_excel(writer, index=False, header=header)
+        sh = writer.sheets[list(writer.sheets)[0]]
+        fmt = writer.book.add_format({"num_format" : "$#,##0"})
+        for col in (money_cols or []):
+            c = df.columns.get_loc(col)
+            sh.set_column(c, c, 14, fmt)
+        if header: sh.freeze_panes(1, 0)
+
+def save_workbook(wb, filename):
+    
+    '''
+    Save openpyxl workbook to memory, and write it to file at once. 
+    The file is written to a temporary file in the same folder and 
+    then replaces "filename", thus an existing file is never left 
+    half-written.
+    
+    Parameters
+    ----------
+    wb : openpyxl Workbook
+        Workbook to be saved.
+        
+    filename : str or file-like object
+        A valid file path e.g. "C:\\Folder\\example.xlsx". For 
+        file-like object e.g. io.BytesIO, the content is written to 
+        it directly.
+    
+    Returns
+    -------
+    buffer : io.BytesIO
+        In-memory content of the workbook.
+    
+    '''
+    buffer = BytesIO()
+    wb.save(buffer)
+    if not isinstance(filename, (str, os.PathLike)):
+        filename.write(buffer.getbuffer())
+        return buffer
+    
+    tmp = f"{os.fspath(filename)}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f: f.write(buffer.getbuffer())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return buffer
@@ -7,16 +7,15 @@ Authors: Danusorn Sitdhirasdr <danusorn.s@kasikornbank.com>
 versionadded:: 10-08-2023
 
 '''
-import pandas as pd, numpy as np, os, re
+import pandas as pd, os, re
 from datetime import datetime, timedelta
-from functools import partial
-from collections import namedtuple
-from itertools import product
-import openpyxl
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import openpyxl, xlsxwriter
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import (PatternFill, Border, Side, 
                              Alignment, Font, Protection)
-from openpyxl.utils import get_column_letter
 import hashlib, hmac, base64
 import logging
 import ExcelLib as EXCEL
@@ -25,7 +24,7 @@ from tqdm.notebook import tqdm_notebook
 import ipywidgets as widgets
 from IPython.display import display
 import shutil, logging
-import urllib
+import urllib.parse
 
 __all__ = ["AuditReport", 
            "SendReport"]
@@ -51,30 +50,47 @@ file_handler.setFormatter(Formatter)
 logger.addHandler(file_handler)
 logger.propagate = False
 
-def Worksheet(sh, r, c):
-    return sh.cell(r,c).value
+# Thin border (immutable) shared by all formats
+THIN = Side(border_style="thin", color='2f3542')
+SIDE_KEYS = ("right", "left", "top", "bottom")
+
+def AllSides(side):
+    '''Same border on every side of cell'''
+    return dict.fromkeys(SIDE_KEYS, side)
+
+# Format parameters (do not modify, copy instead)
+GENERAL_FMT = AllSides(THIN)
+ISBLANK_FMT = dict(fill_type="lightUp", start_color='BFBFBF', **GENERAL_FMT)
+HEADER_FMT  = dict(fill_type="solid", start_color='D0CECE', 
+                   size=9, wrap_text=True, color="404040", 
+                   vertical="center", horizontal="center", 
+                   bold=True, **GENERAL_FMT)
+
+# Hidden column of "Summary" i.e. ReceivedTime in seconds since epoch
+EPOCH, EPOCH_COL = datetime(1970, 1, 1), "ReceivedTime_epoch"
+
+# Maximum number of characters in a cell (Excel)
+MAX_STRLEN = 32767
+
+# User and computer (Windows) that run the reports
+USERNAME, COMPUTERNAME = os.environ.get("USERNAME"), os.environ.get("COMPUTERNAME")
+
+# Mail subject, period (%Y%m%d), and pattern e.g. "A001"
+SUBJECT = re.compile("internal fraud data", re.IGNORECASE)
+PERIOD  = re.compile("[0-9]{8}")
+PATTERN = re.compile("[A-Z][0-9]{3}")
 
 def hmac_hash(raw, key="admin", digestmod="sha1"):
     
-    '''Hashing'''
-    raw = raw.encode("utf-8")
-    key = key.encode('utf-8')
-    hashed = hmac.new(key, raw, digestmod=digestmod)
-    hashed = hashed.hexdigest()
-    return hashed
+    '''Hashing (single string, see hmac_hashes)'''
+    return hmac_hashes([raw], key, digestmod)[0]
 
-class sum_namedtuple:
-    
-    '''Merge named tuples'''
-    def __init__(self, typename="MergedTuples"):
-        self.typename = typename
-    
-    def sum_classes(self, *args):
-        a = sum(map(lambda t:t._fields, args), ())
-        return namedtuple(self.typename, a)
+def hmac_hashes(raws, key="admin", digestmod="sha1"):
     
-    def merge(self, *args):
-        return self.sum_classes(*args)(*sum(args,()))
+    '''Hashing (batch of strings) with one-shot C digest per string'''
+    key, digest = key.encode('utf-8'), hmac.digest
+    return [digest(key, raw.encode("utf-8"), digestmod).hex() 
+            for raw in raws]
 
 def GetParameters(sh, sheetnames:list):
     
@@ -87,63 +103,77 @@ def GetParameters(sh, sheetnames:list):
     # Initialize parameters
     datavalid, hexcolors, hashedcol = dict(), dict(), dict()
     usecols = dict([(n,[]) for n in sheetnames + ["hash", "mandate"]])
-    columns = dict([(c.value,n) for n,c in enumerate(sh[1],1) 
-                    if c.value is not None])
+    
+    # Worksheet in read-only mode may be unsized
+    try: sh.calculate_dimension()
+    except ValueError: sh.reset_dimensions()
+    
+    # Column index (0-based) of row values
+    header = EXCEL.RowValues(sh)
+    columns = dict([(v,n) for n,v in enumerate(header) if v is not None])
+    
+    # Column indices of parameters (looked up once for all rows)
+    dvcols  = [(c, columns[c]) for c in ["type", "operator", 
+                                         "formula1", "formula2"]]
+    hexcols = [(c, columns[c]) for c in ["start_color","color"]]
+    keycols = [(key, columns[key]) for key in usecols.keys()]
 
-    ws = partial(Worksheet, sh)
-    for r in np.arange(2, sh.max_row + 1):
+    for ws in sh.iter_rows(min_row=2, max_col=len(header), 
+                           values_only=True):
 
         # Validation parameters
-        if (ws(r,2) != "text") & (ws(r,2) is not None):
-            kwargs = {"type"     : ws(r, columns["type"]), 
-                      "operator" : ws(r, columns["operator"]),
-                      "formula1" : ws(r, columns["formula1"]), 
-                      "formula2" : ws(r, columns["formula2"])}
-            datavalid[ws(r,1)] = EXCEL.Validation(**kwargs)
+        if (ws[1] != "text") & (ws[1] is not None):
+            kwargs = {c : ws[n] for c,n in dvcols}
+            datavalid[ws[0]] = EXCEL.Validation(**kwargs)
 
         # Hex-color code
-        hexcolors[ws(r,1)] = {c : ws(r, columns[c]).replace("#","") 
-                              for c in ["start_color","color"]} 
+        hexcolors[ws[0]] = {c : ws[n].replace("#","") for c,n in hexcols} 
  
         # Keep columns
-        for key in usecols.keys():
-            if ws(r, columns[key])>0: 
-                usecols[key] += [(ws(r, columns[key]),ws(r,1))] 
+        for key,n in keycols:
+            if ws[n]>0: usecols[key] += [(ws[n],ws[0])] 
         
     # Sort column labels in list
     for key in usecols.keys(): 
         usecols[key].sort(key=lambda x:x[0],reverse=False)
     
-    Params = namedtuple("Params", ("dv","hex","cols"))
-    return Params(datavalid, hexcolors, usecols)
+    return SimpleNamespace(dv=datavalid, hex=hexcolors, cols=usecols)
 
 def ApplyFormats(sh, CellFormats, 
                  ColumnFormats=dict(), 
                  DataValidations=dict()):
     
     '''Apply format and data validation'''
-    # General format for every cell
-    columns = [c.value for c in sh[1]]
-    CellFormats["general"].apply(sh, (1,1), 
-                                 (max_rows := np.fmax(sh.max_row-1,1), 
-                                  max_cols := len(columns)-1))
+    # General format for every cell (header is overwritten by "columns")
+    columns = EXCEL.RowValues(sh)
+    max_rows, max_cols = max(sh.max_row-1,1), len(columns)-1
+    CellFormats["general"].apply(sh, (2,1), (max_rows-1, max_cols))
     CellFormats["isblank"].apply(sh, (2,1), (max_rows-1, max_cols))
     CellFormats["columns"].apply(sh, (1,1), (0, max_cols))
 
-    # Apply data validation and column format
-    for c,col in enumerate(columns, 1):
+    # Columns with format and data validation (looked up once)
+    fmt_cols = [(c, ColumnFormats[col]) for c,col in enumerate(columns, 1) 
+                if col in ColumnFormats]
+    val_cols = [(c, DataValidations[col]) for c,col in enumerate(columns, 1) 
+                if col in DataValidations]
+    
+    # Apply column formats
+    for c,cellformat in fmt_cols: cellformat.apply(sh, (1,c))
         
-        # Apply column formats
-        if col in ColumnFormats.keys(): 
-            ColumnFormats[col].apply(sh, (1,c))
-            
-        # Apply data validation and default list value
-        if col in DataValidations.keys(): 
-            DataValidations[col].apply(sh, (2,c), (max_rows-1,0))
-            if (DataValidations[col].dv.type=="list") & \
-            (DataValidations[col].dv.formula1.find("ไม่ระบุ")>-1):
-                for r in range(2, max_rows + 2):
-                    sh.cell(r,c).value = "ไม่ระบุ"
+    # Collect data validation ranges and apply default list value
+    ranges = dict()
+    for c,validation in val_cols:
+        ranges.setdefault(validation, [])
+        ranges[validation] += [((2,c), (max_rows-1,0))]
+        if (validation.dv.type=="list") & \
+        (validation.dv.formula1.find("ไม่ระบุ")>-1):
+            for (cell,) in sh.iter_rows(min_row=2, max_row=max_rows + 1, 
+                                        min_col=c, max_col=c):
+                cell.value = "ไม่ระบุ"
+    
+    # Apply data validation (all columns at once)
+    for validation, rngs in ranges.items():
+        validation.apply_many(sh, rngs)
 
 def GeneralFormats(params):
     
@@ -154,56 +184,64 @@ def GeneralFormats(params):
     '''
     # Initialize parameters
     CellFormats = dict()
-    sides = ["right", "left", "top", "bottom"]
 
     # General format
-    side1 = Side(border_style="thin", color='2f3542')
-    side1 = dict(product(sides, [side1]))
-    CellFormats["general"] = EXCEL.CellStyle(side1)
+    CellFormats["general"] = EXCEL.CellStyle(GENERAL_FMT)
 
     # Format for cells with data validation (ISBLANK)
-    side2 = Side(border_style="thin", color='2f3542')
-    kwds = dict(fill_type="lightUp", start_color='BFBFBF')
-    kwds.update(dict(product(sides, [side2])))
-    CellFormats["isblank"] = EXCEL.Formulaformat(kwds)
+    CellFormats["isblank"] = EXCEL.Formulaformat(ISBLANK_FMT)
 
     # Fill pattern for normal columns
-    side4 = Side(border_style="thin", color='2f3542')
-    kwds = dict(fill_type="solid", start_color='D0CECE', 
-                size=9, wrap_text=True, color="404040", 
-                vertical="center", horizontal="center", 
-                bold=True)
-    kwds.update(dict(product(sides,[side4])))
-    CellFormats["columns"] = EXCEL.CellStyle(kwds)
+    CellFormats["columns"] = EXCEL.CellStyle(HEADER_FMT)
 
     # Fill pattern of added columns
+    kwds = dict(HEADER_FMT)
     ColumnFormats = dict()
     for key in params.hex.keys():
         kwds.update({k: params.hex[key][k] for k in ["start_color", "color"]})
         ColumnFormats[key] = EXCEL.CellStyle(kwds)
     
-    Params = namedtuple("Params", ("cell","cf"))
-    return Params(CellFormats, ColumnFormats)
+    return SimpleNamespace(cell=CellFormats, cf=ColumnFormats)
+
+def RegisterStyles(wb, params):
+    
+    '''
+    Register header formats as named styles in workbook, so that each 
+    header cell refers to its style by name. Formats of data cells are 
+    not registered as named style resets number format e.g. dates.
+    params : output from GeneralFormats
+    '''
+    params.cell["columns"].register(wb, "InternalFraud.header")
+    for key, cellformat in params.cf.items():
+        cellformat.register(wb, f"InternalFraud.header ({key})")
 
 def AuditSheet(sh, params):
     
-    '''Create "Audit" sheet'''
+    '''
+    Create "Audit" sheet, and return list of ("ref_id", "emp_id") 
+    of all rows, which is used to create "Result" sheet.
+    '''
     # Add new columns to "Audit" sheet
     new_columns = [c[1] for c in params.cols["Audit"]]
     max_columns = sh.max_column + 1
-    all_columns = [c.value for c in sh[1]] + new_columns
+    all_columns = EXCEL.RowValues(sh) + new_columns
     for c,col in enumerate(new_columns, max_columns):
         sh.cell(1,c).value = col
 
     # Adding ref_id
     hashcol = [c[1] for c in params.cols['hash']]
-    hashidx = [n for n,c in enumerate(sh[1],1) if c.value in hashcol]
-    ref_col = np.argmax(np.isin(all_columns, "ref_id")) + 1
-    emp_col = np.argmax(np.isin(all_columns, "emp_id")) + 1
-    for r in range(2, sh.max_row + 1):
-        raw = "".join([str(v) for c in hashidx 
-                       if (v:=sh.cell(r,c).value) is not None])
-        sh.cell(r, ref_col).value = hmac_hash(raw)
+    hashidx = [n for n,c in enumerate(all_columns,1) if c in hashcol]
+    index = ColumnIndex(all_columns)
+    ref_col, emp_col = index["ref_id"], index["emp_id"]
+    c0, c1 = min(hashidx + [emp_col]), max(hashidx + [emp_col])
+    hashpos = [c - c0 for c in hashidx]
+    rows = list(sh.iter_rows(min_row=2, max_row=sh.max_row, min_col=c0, 
+                             max_col=c1, values_only=True))
+    refs = hmac_hashes("".join([str(row[n]) for n in hashpos 
+                                if row[n] is not None]) for row in rows)
+    for r,ref in enumerate(refs, 2):
+        sh.cell(r, ref_col, value=ref)
+    ids = list(zip(refs, [row[emp_col - c0] for row in rows]))
     
     # Apply format to "Audit" sheet                
     ApplyFormats(sh, 
@@ -222,24 +260,31 @@ def AuditSheet(sh, params):
     EXCEL.ProtectSheet(sh, labels=new_columns, 
                        password="admin", 
                        protect=False)
+    return ids
 
-def ResultSheet(sh1, sh2, params):
+def ResultSheet(sh1, sh2, params, ids=None):
     
-    '''Create "Result" sheet'''
+    '''
+    Create "Result" sheet. "ids" is a list of ("ref_id", "emp_id") 
+    from AuditSheet. If None, they are read from "Audit" sheet.
+    '''
     # Add new columns to "Result" sheet
     for c,col in params.cols["Result"]:
         sh2.cell(1,c).value = col
     
     # Find position of ref_id and emp_id
-    all_columns = [c.value for c in sh1[1]] + \
-    [c[1] for c in params.cols["Audit"]]
-    ref_col = np.argmax(np.isin(all_columns, "ref_id")) + 1
-    emp_col = np.argmax(np.isin(all_columns, "emp_id")) + 1
+    if ids is None:
+        all_columns = EXCEL.RowValues(sh1) + \
+        [c[1] for c in params.cols["Audit"]]
+        index = ColumnIndex(all_columns)
+        ref_col, emp_col = index["ref_id"], index["emp_id"]
+        ids = [(row[ref_col-1], row[emp_col-1]) for row in 
+               sh1.iter_rows(min_row=2, max_row=sh1.max_row, values_only=True)]
     
     # Add "ref_id" and "emp_id"
-    for r in range(2, sh1.max_row + 1):
-        sh2.cell(r, 1).value = sh1.cell(r, ref_col).value
-        sh2.cell(r, 2).value = sh1.cell(r, emp_col).value
+    for r,(ref,emp) in enumerate(ids, 2):
+        sh2.cell(r, 1, value=ref)
+        sh2.cell(r, 2, value=emp)
 
     # Apply format to "Audit" sheet                
     ApplyFormats(sh2, 
@@ -253,35 +298,31 @@ def ResultSheet(sh1, sh2, params):
     # Apply autofilter
     EXCEL.AutoFilter(sh2, header=1)
 
-def find_lastrow(sh, delete=False):
-    
-    '''Find the last row that contains data'''
-    row = sh.max_row
-    empty = True
-    while empty:
-        column = 1
-        while column<=sh.max_column:
-            if sh.cell(row,column).value is not None: 
-                empty = False; break
-            else: column += 1
-        else: row -= 1
-        if delete: sh.delete_rows(row+1)    
-    return row
-
-def find_lastcolumn(sh, delete=False):
-    
-    '''Find the last column that contains data'''
-    column = sh.max_column
-    empty = True
-    while empty:
-        row = 1
-        while row<=sh.max_row:
-            if sh.cell(row,column).value is not None: 
-                empty = False; break
-            else: row += 1
-        else: column -= 1
-        if delete: sh.delete_cols(column+1)    
-    return column
+def FindColumn(columns, colname):
+    '''Find position of column label (stop at the first match)'''
+    for n,col in enumerate(columns, 1):
+        if col==colname: return n
+    raise KeyError(colname)
+
+def ColumnIndex(columns):
+    '''Position of every column label (first match is kept)'''
+    index = dict()
+    for n,col in enumerate(columns, 1): index.setdefault(col, n)
+    return index
+
+def scan_data(sh, header=1):
+    
+    '''
+    Find the last row and column that contain data, and number of
+    data points below header in one pass.
+    '''
+    row, column, n_points = 0, 0, 0
+    for n,values in enumerate(sh.iter_rows(values_only=True), 1):
+        used = [c for c,v in enumerate(values, 1) if v is not None]
+        if len(used)==0: continue
+        row, column = n, max(column, used[-1])
+        if n > header: n_points += len(used)
+    return row, column, n_points
 
 class AuditReport_base:
     
@@ -299,11 +340,11 @@ class AuditReport_base:
     '''
     def __init__(self, source, sheetname):
         self.source = source
-        wb = load_workbook(source)
+        wb = load_workbook(source, read_only=True)
         self.sheetnames = ["Audit", "Result"]
         p0 = GetParameters(wb[sheetname], self.sheetnames)
         p1 = GeneralFormats(p0)
-        self.params = sum_namedtuple("Params").merge(p0,p1)
+        self.params = SimpleNamespace(**vars(p0), **vars(p1))
         wb.close()
         self.Workbook = openpyxl.workbook.workbook.Workbook
     
@@ -343,9 +384,10 @@ class AuditReport_base:
         wb  = EXCEL.CopySheet(wb, "Data", self.sheetnames[0])
         sh1 = wb[self.sheetnames[0]]
         sh2 = wb.create_sheet(self.sheetnames[1], 1) 
-        AuditSheet(sh1, self.params)
-        ResultSheet(sh1, sh2, self.params)
-        wb.save(saveas)
+        RegisterStyles(wb, self.params)
+        ids = AuditSheet(sh1, self.params)
+        ResultSheet(sh1, sh2, self.params, ids)
+        EXCEL.save_workbook(wb, saveas)
         wb.close()
         del wb
 
@@ -369,8 +411,9 @@ def SaveExcel(attachments, workbook, saveas, fields, sheetname="Data"):
         any intermediate-level directory is missing, os.makedirs() 
         method will create them all.
         
-    fields : list of str
-        A list of madatory column labels.
+    fields : list or frozenset of str
+        A list of madatory column labels. A frozenset is preferred as 
+        every header label is looked up in it.
         
     sheetname : str, default="Data"
         String that is used for sheet name.
@@ -389,26 +432,28 @@ def SaveExcel(attachments, workbook, saveas, fields, sheetname="Data"):
     for name,obj in attachments.items():
         if os.path.splitext(name)[1].find(".xls")>-1:
             obj.SaveAsFile(path)
-            wb  = load_workbook(path)
-            row = find_lastrow(wb[sheetname], True)
-            col = find_lastcolumn(wb[sheetname], True)
+            wb  = load_workbook(path, read_only=True, data_only=True)
+            sheets  = wb.sheetnames
+            hasdata = sheetname in sheets
+            if hasdata: 
+                sh  = wb[sheetname]
+                try: sh.calculate_dimension()
+                except ValueError: sh.reset_dimensions()
+                row, col, n_points = scan_data(sh)
             
-            content = {"sheets"  : ",".join(wb.sheetnames),
-                       "n_sheets": len(sheets:=wb.sheetnames),
-                       "hasdata" : (hasdata:=sheetname in sheets),
-                       "n_rows"  : (nr:=wb[sheetname].max_row-1 if hasdata else 0),
-                       "n_cols"  : (nc:=wb[sheetname].max_column if hasdata else 0), 
-                       "range"   : (rng:=f"A2:{get_column_letter(max(nc,1))}{max(nr+1,2)}"),
-                       "n_points": (n_points:=len([n.value 
-                                                   for n in np.r_[wb[sheetname][rng]] 
-                                                   if n.value is not None]) 
-                                    if hasdata else 0), 
+            content = {"sheets"  : ",".join(sheets),
+                       "n_sheets": len(sheets),
+                       "hasdata" : hasdata,
+                       "n_rows"  : (nr:=max(row-1,0) if hasdata else 0),
+                       "n_cols"  : (nc:=col if hasdata else 0), 
+                       "range"   : f"A2:{EXCEL.ColumnLetter(max(nc,1))}{max(nr+1,2)}",
+                       "n_points": (n_points:=n_points if hasdata else 0), 
                        "p_point" : round(100*n_points/max(nr*nc,1),2), 
-                       "p_match" : round(100*len([c.value for c in wb[sheetname]["1"] 
-                                                  if c.value in fields])/len(fields) 
+                       "p_match" : round(100*sum(c in fields for c in 
+                                                 EXCEL.RowValues(sh))/len(fields) 
                                          if hasdata else 0,2),
-                       "username": os.environ["USERNAME"],
-                       "computer": os.environ["COMPUTERNAME"],
+                       "username": USERNAME,
+                       "computer": COMPUTERNAME,
                        "complete": "FALSE",
                        "SendTime": None, 
                        "SendUser": None,
@@ -418,14 +463,15 @@ def SaveExcel(attachments, workbook, saveas, fields, sheetname="Data"):
     return content
 
 def findword(s, regex):
-    return p[0] if len(p:=re.findall(regex,s))>0 else None
+    '''First match of compiled pattern (None if not found)'''
+    return p[0] if (p:=regex.search(s)) is not None else None
 
 def ExtractMailContents(ReportGenerator, mails, source):
     
     '''
     Extract contents from mails as well as save attachments (if any)
     ReportGenerator : AuditReport_base class
-    mails : output from OUTLOOK.ReadMail
+    mails : output from OUTLOOK.ReadMail (dict) or OUTLOOK.IterMail
     source : valid file path for repository
     '''
     # Initialize widgets, and paramters
@@ -434,27 +480,26 @@ def ExtractMailContents(ReportGenerator, mails, source):
     n_valid = 0
     files = dict()
     
-    # Mail subject content (lower case)
-    subj = "Internal fraud Data".lower()
-    
     # Mandatory fields
-    fields = [c for _,c in ReportGenerator.params.cols["mandate"]]
-    logger.info(f"Number of emails : {len(mails):,.0f}.")
+    fields = frozenset(c for _,c in ReportGenerator.params.cols["mandate"])
+    if isinstance(mails, dict): mails = mails.values()
+    n_mails = 0
 
-    for n in tqdm_notebook(mails.keys()):
-        mail = namedtuple("Mail", mails[n].keys())(*mails[n].values())
+    for content in tqdm_notebook(mails):
+        mail = SimpleNamespace(**content)
+        n_mails += 1
         t.value = mail.Subject
 
         if (att:=mail.Attachments) is not None:
-            if re.findall(subj, mail.Subject.lower()).count(subj)>0:
+            if SUBJECT.search(mail.Subject) is not None:
                 
                 text = " ".join([mail.Subject, mail.Body])
                 text = text[text.lower().find("subject"):]
-                prd  = findword(text, "[0-9]{8}")
-                pat  = findword(text, "[A-Z][0-9]{3}")
+                prd  = findword(text, PERIOD)
+                pat  = findword(text, PATTERN)
                 if (prd is None) | (pat is None):
-                    prd = findword(mail.Subject, "[0-9]{8}")
-                    pat = findword(mail.Subject, "[A-Z][0-9]{3}")
+                    prd = findword(mail.Subject, PERIOD)
+                    pat = findword(mail.Subject, PATTERN)
                 
                 content = {"period"       : prd,
                            "pattern"      : pat,
@@ -487,68 +532,93 @@ def ExtractMailContents(ReportGenerator, mails, source):
                              f"<{mail.ReceivedTime}> does not "
                              f"have attachment(s).")
                 
+    logger.info(f"Number of emails : {n_mails:,.0f}.")
     t.value = "Number of emails w/ attachments : {:,.0f}".format(n_valid)
     return files
 
-def ApplySummaryFormats(path):
+def SummaryFormats(book):
     
-    '''Apply formats to sheet, namely "Summary".'''
-    # Initialize parameters
-    wb = load_workbook(path)
-    sh = wb["Summary"]
-    sides = ["right", "left", "top", "bottom"]
-    columns = [c.value for c in sh["1"]]
-    offset = (sh.max_row-1, sh.max_column-1)
-
-    # General format
-    side1 = Side(border_style="thin", color='2f3542')
-    side1 = dict(product(sides, [side1]))
-    EXCEL.CellStyle(side1).apply(sh, offset=offset)
-
-    # Format for cells with data validation (ISBLANK)
-    side2 = Side(border_style="thin", color='2f3542')
-    kwds = dict(fill_type="lightUp", start_color='BFBFBF')
-    kwds.update(dict(product(sides, [side2])))
-    EXCEL.Formulaformat(kwds).apply(sh, offset=offset)
-
-    # Fill pattern for normal columns
-    side4 = Side(border_style="thin", color='2f3542')
-    kwds = dict(fill_type="solid", start_color='D0CECE', 
-                size=9, wrap_text=True, color="404040", 
-                vertical="center", horizontal="center", 
-                bold=True)
-    kwds.update(dict(product(sides,[side4])))
-    EXCEL.CellStyle(kwds).apply(sh, offset=(0, sh.max_column-1))
-
-    # Format for cells with data validation (ISBLANK)
-    side2 = Side(border_style="thin", color='2f3542')
-    kwds = dict(fill_type="lightUp", start_color='FF0000')
-    kwds.update(dict(product(sides, [side2])))
-    ErrorFormat = EXCEL.Formulaformat(kwds)
-    Errorparams = {'hasdata': '{}2=FALSE'.format, 
-                   'n_rows' : '{}2=0'.format, 
-                   'n_cols' : '{}2<12'.format,
-                   'p_match': '{}2<100'.format}
-    
-    # Apply formats to cells
-    for col,formula in Errorparams.items():
-        c = np.argmax(np.isin(columns,col))+1 
-        ErrorFormat.apply(sh, (2, c), offset=(sh.max_row-2, 0), 
-                          formula=formula(get_column_letter(c)))
-        
-    # Apply validation
-    c = np.argmax(np.isin(columns,"complete"))+1 
-    kwargs = {"type" : "list", "formula1" : "TRUE, FALSE",}
-    EXCEL.Validation(**kwargs).apply(sh, (2,c), offset=(sh.max_row-2, 0))
-
-     # Turn grid lines off
-    sh.sheet_view.showGridLines = False
-
-    # Apply autofilter
-    EXCEL.AutoFilter(sh, header=1)
+    '''
+    "xlsxwriter" formats of "Summary" sheet i.e. general, header, 
+    isblank, and error (pattern 14 is "lightUp").
+    '''
+    general = {"font_name" : "Tahoma", "font_size" : 10, 
+               "font_color": "#404040", "border" : 1, 
+               "border_color" : "#2F3542"}
+    header  = {"font_size" : 9, "bold" : True, "text_wrap" : True, 
+               "align" : "center", "valign" : "vcenter", 
+               "pattern" : 1, "bg_color" : "#D0CECE"}
+    blank   = {"pattern" : 14, "fg_color" : "#BFBFBF", 
+               "bg_color": "#000000"}
+    error   = {"pattern" : 14, "fg_color" : "#FF0000", 
+               "bg_color": "#000000"}
+    return {"general": book.add_format(general), 
+            "header" : book.add_format({**general, **header}),
+            "isblank": book.add_format({**general, **blank}), 
+            "error"  : book.add_format({**general, **error})}
+
+def WriteSummary(df, path):
     
-    wb.save(path)
-    wb.close()
+    '''
+    Write "Summary" sheet with "xlsxwriter" (directly, without pandas' 
+    ExcelWriter). Formats are applied while cells are written, so that 
+    the workbook is serialized once. Rows are written in order and 
+    flushed to disk one at a time ("constant_memory"), thus memory does 
+    not grow with number of rows.
+    '''
+    columns = list(df.columns)
+    last_row, last_col = len(df), len(columns)-1
+    options = {"constant_memory": True, "strings_to_urls": False}
+    with xlsxwriter.Workbook(path, options) as book:
+        sh = book.add_worksheet("Summary")
+        formats = SummaryFormats(book)
+        
+        # Header and data (NaN is written as blank cell). Cells are 
+        # written one at a time, so that a cell that cannot be written 
+        # does not drop the rest of the row (as write_row does). Long 
+        # strings are truncated to the Excel limit.
+        sh.write_row(0, 0, columns, formats["header"])
+        values = df.astype(object).where(df.notna(), None)
+        for r,row in enumerate(values.itertuples(index=False, name=None), 1):
+            for c,value in enumerate(row):
+                if isinstance(value, str) and len(value) > MAX_STRLEN:
+                    value = value[:MAX_STRLEN]
+                try: failed = sh.write(r, c, value, formats["general"]) != 0
+                except TypeError: failed = True
+                if failed: logger.warning(f"<{columns[c]}> of row {r+1} cannot "
+                                          f"be written to <{path}>.")
+            
+        # Format for blank cells, and cells with error
+        sh.conditional_format(0, 0, last_row, last_col, 
+                              {"type": "formula", "criteria": "=ISBLANK(A1)", 
+                               "format": formats["isblank"], 
+                               "stop_if_true": True})
+        Errorparams = {'hasdata': '={}2=FALSE'.format, 
+                       'n_rows' : '={}2=0'.format, 
+                       'n_cols' : '={}2<12'.format,
+                       'p_match': '={}2<100'.format}
+        for col,formula in Errorparams.items():
+            c = FindColumn(columns, col) - 1
+            sh.conditional_format(1, c, max(last_row,1), c, 
+                                  {"type": "formula", 
+                                   "criteria": formula(EXCEL.ColumnLetter(c+1)), 
+                                   "format": formats["error"], 
+                                   "stop_if_true": True})
+        
+        # Apply validation
+        c = FindColumn(columns, "complete") - 1
+        sh.data_validation(1, c, max(last_row,1), c, 
+                           {"validate": "list", "source": ["TRUE", "FALSE"]})
+        
+        # Turn grid lines off, apply autofilter, and freeze header
+        sh.hide_gridlines(2)
+        sh.autofilter(0, 0, last_row, last_col)
+        sh.freeze_panes(1, 0)
+        
+        # Hide helper column (if any)
+        if EPOCH_COL in columns:
+            c = columns.index(EPOCH_COL)
+            sh.set_column(c, c, None, None, {"hidden": True})
 
 class AuditReport:
     
@@ -644,13 +714,30 @@ class AuditReport:
         
     def __lastestdate__(self, path:str):
         
-        '''Get the latest ReceivedTime'''
-        self.prevmails = None
+        '''
+        Get the latest ReceivedTime. Only one column is read i.e. 
+        "ReceivedTime_epoch" (seconds) or "ReceivedTime" (string) 
+        when the former is not available.
+        '''
         if os.path.exists(path):
-            self.prevmails = pd.read_excel(path, sheet_name="Summary")
-            max_dt = pd.to_datetime(self.prevmails["ReceivedTime"],
-                                    format=self.datetime_format).max() 
-            max_dt = np.fmax(max_dt+timedelta(seconds=1), self.min_date)
+            wb = load_workbook(path, read_only=True)
+            sh = wb["Summary"]
+            columns = EXCEL.RowValues(sh)
+            hasepoch = EPOCH_COL in columns
+            c = FindColumn(columns, EPOCH_COL if hasepoch else "ReceivedTime")
+            values = (v for (v,) in sh.iter_rows(min_row=2, min_col=c, max_col=c, 
+                                                 values_only=True) 
+                      if v not in (None, ""))
+            if hasepoch:
+                max_dt = max(values, default=None)
+                if max_dt is not None: max_dt = EPOCH + timedelta(seconds=max_dt)
+            else: 
+                max_dt = max((v if isinstance(v, datetime) else 
+                              datetime.strptime(v, self.datetime_format) 
+                              for v in values), default=None)
+            wb.close()
+            if max_dt is None: return self.str_date(self.min_date)
+            max_dt = max(max_dt+timedelta(seconds=1), self.min_date)
             return self.str_date(max_dt)
         else: return self.str_date(self.min_date)
 
@@ -666,12 +753,12 @@ class AuditReport:
 
         '''
         logger.info("Initialize [Creating Report]")
-        mails = OUTLOOK.ReadMail(source, **self.kwargs)
+        mails = OUTLOOK.IterMail(source, **self.kwargs)
         args  = (self.generator, mails, self.source3)
         self.mails = ExtractMailContents(*args)
         self.__summary__()
         logger.info("Terminate [Creating Report]")
-        logging.shutdown()
+        file_handler.flush()
         return self
     
     def __summary__(self):
@@ -681,10 +768,18 @@ class AuditReport:
         '''
         if len(self.mails)>0:
             df = pd.DataFrame(self.mails).T
-            if self.prevmails is not None:
-                df = pd.concat((self.prevmails, df), ignore_index=True)
-            df.to_excel(self.source2, sheet_name="Summary", index=False)
-            ApplySummaryFormats(self.source2)
+            if os.path.exists(self.source2):
+                prevmails = pd.read_excel(self.source2, sheet_name="Summary")
+                df = pd.concat((prevmails, df), ignore_index=True)
+            
+            # ReceivedTime in seconds since epoch (new rows only)
+            if EPOCH_COL not in df: df[EPOCH_COL] = None
+            missing = df[EPOCH_COL].isna()
+            received = pd.to_datetime(df.loc[missing, "ReceivedTime"], 
+                                      format=self.datetime_format)
+            df.loc[missing, EPOCH_COL] = ((received - EPOCH) // 
+                                          timedelta(seconds=1))
+            WriteSummary(df, self.source2)
             logger.debug(f"<{self.source2}> has been saved successfully.")
 
 class SendReport:
@@ -710,6 +805,7 @@ class SendReport:
     '''
     sheet_name = "Summary"
     usecols = ["SendTime","SendUser","SendComputer"]
+    max_workers = 8
     
     def __init__(self, source, 
                  sheet_name1="Rename", 
@@ -717,6 +813,7 @@ class SendReport:
                  overwrite=True):
         
         self.overwrite = overwrite
+        self.cache = (None, None, None)
         if not os.path.exists(source):
             raise ValueError(f'Invalid file path : "{source}".')
         
@@ -772,80 +869,134 @@ class SendReport:
             os.makedirs(self.destination)
             
         # Every file that has not been sent out.
-        locales = pd.read_excel(source, sheet_name=self.sheet_name)
+        locales = self.__locales__(source)
         unsents = locales.loc[locales["SendTime"].isna() & 
                               (locales["complete"]==True),
                               ["saveas","workbook","pattern"]]
         unsents = unsents.reset_index().values
         logger.info("Number of unsent files : {:,.0f}.".format(len(unsents)))
         
-        # Copy file from source to destination
-        for n, saveas, workbook, pattern in tqdm_notebook(unsents):
+        # Files to be copied (folders are created beforehand). A file 
+        # planned to be copied to the same destination earlier is treated 
+        # as an existing file. Copies to the same destination are done in 
+        # order i.e. one per round.
+        copies, success, planned = dict(), dict(), dict()
+        for n, saveas, workbook, pattern in unsents:
             
             locale0 = os.path.join(saveas, workbook)
-            locale1 = os.path.join(destination, self.rename[pattern], workbook)
-            success = True
+            locale1 = os.path.join(self.destination, self.rename[pattern], workbook)
+            success[n] = True
             
             if os.path.exists(locale0):
      
-                folder, file = os.path.split(locale1)
+                folder = os.path.dirname(locale1)
                 if not os.path.exists(folder):
-                    os.makedirs(folder)
-                    folder = folder.replace(destination,"")
+                    os.makedirs(folder, exist_ok=True)
+                    folder = folder.replace(self.destination,"")
                     logger.debug(f"<..{folder}> has been created successfully.")
-                    
-                # Copy file to destination
-                if os.path.exists(locale1) and self.overwrite:
-                    dest = shutil.copyfile(locale0, locale1)
-                    logger.debug(f"<{file}> has been overwritten successfully.")
-                elif not os.path.exists(locale1):    
-                    dest = shutil.copyfile(locale0, locale1)
-                    logger.debug(f"<{file}> has been copied successfully.")
+                
+                exists = (locale1 in planned) or os.path.exists(locale1)
+                if exists and not self.overwrite:
+                    logger.warning(f"Copy failed. <{workbook}> already exists.")
+                    success[n] = False
                 else: 
-                    logger.warning(f"Copy failed. <{file}> already exists.")
-                    success = False
- 
+                    k = planned[locale1] = planned.get(locale1, -1) + 1
+                    copies[n] = (locale0, locale1, exists, k)
+                    
             else: logger.debug(f"<{locale0}> cannot be found.")
-            
-            # Update summary files
-            if success:
-                locales.loc[n, self.usecols] = [f"{datetime.now():%d-%m-%Y %H:%M:%S}",
-                                                os.environ["USERNAME"],
-                                                os.environ["COMPUTERNAME"]]
-            
-            # Sending out mail to notify relevant personnel
-            if success & send:
-                period, n_rows = locales.loc[n,['period','n_rows']].astype(int)
-                period = "{:%d-%m-%Y}".format(datetime.strptime(str(period),"%Y%m%d"))
-                html = CreateHTML(self.rename[pattern], workbook, period, n_rows)
-                OUTLOOK.SendMail(html, **{**self.kwargs,**{"display":display}})
-                logger.debug(f"์Notification email of <{workbook}> "
-                             f"has been sent out successfully.")
+        
+        # Copy files from source to destination (concurrently). A failed 
+        # copy is logged, and its row is not marked as sent.
+        n_rounds = max(planned.values(), default=-1) + 1
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for k in range(n_rounds):
+                futures = dict((n, executor.submit(shutil.copyfile, *args[:2])) 
+                               for n,args in copies.items() if args[3]==k)
+                for n,future in tqdm_notebook(futures.items()):
+                    file = os.path.basename(copies[n][1])
+                    try: future.result()
+                    except OSError as e:
+                        logger.error(f"Copy failed. <{file}> : {e}")
+                        success[n] = False
+                        continue
+                    if copies[n][2]: 
+                        logger.debug(f"<{file}> has been overwritten successfully.")
+                    else: logger.debug(f"<{file}> has been copied successfully.")
+        
+        # Sending out mail to notify relevant personnel. When "send" is 
+        # True, only rows whose mail has been sent are marked as sent, so
+        # that the others are retried in next run.
+        sent = [n for n,done in success.items() if done]
+        if send and len(sent):
+            rows = locales.loc[sent, ["workbook","pattern","period","n_rows"]]
+            p = rows["period"].astype(int).astype(str) # %Y%m%d
+            rows = rows.assign(period=p.str[6:8] + "-" + p.str[4:6] + "-" + p.str[:4], 
+                               n_rows=rows["n_rows"].astype(int))
+            mails = [{**self.kwargs, **{"htmlbody":CreateHTML(self.rename[row.pattern], 
+                                                              row.workbook, row.period, 
+                                                              row.n_rows), 
+                                        "display":display}} 
+                     for row in rows.itertuples(index=False)]
+            notified = OUTLOOK.SendMails(mails)
+            for workbook,done in zip(rows["workbook"], notified):
+                if done: logger.debug(f"์Notification email of <{workbook}> "
+                                      f"has been sent out successfully.")
+                else: logger.error(f"Notification email of <{workbook}> "
+                                   f"cannot be sent out.")
+            sent = [n for n,done in zip(sent, notified) if done]
+        
+        # Update summary files (all successful rows at once)
+        locales[self.usecols] = locales[self.usecols].astype(object)
+        locales.loc[sent, self.usecols] = [f"{datetime.now():%d-%m-%Y %H:%M:%S}",
+                                           USERNAME, COMPUTERNAME]
         
         # Save updated summary (*.xlsx) and apply format
-        locales.to_excel(source, sheet_name="Summary", index=False)
-        ApplySummaryFormats(source)
+        WriteSummary(locales, source)
+        self.cache = (source, os.path.getmtime(source), locales)
         logger.debug(f"<{source}> has been saved successfully.")
         logger.info("Terminate [Sending Files]")
-        logging.shutdown()
+        file_handler.flush()
         
         return self
 
-def CreateHTML(folder, file, period, rows):
-    '''Create html of outlook email'''
-    link  = ("https://kasikornbankgroup-my.sharepoint.com/personal/piti_p_kasikornbank_com/"
+    def __locales__(self, source):
+        
+        '''
+        Read summary, which is reused when file is unchanged since the 
+        last reading or writing (by modification time).
+        '''
+        mtime = os.path.getmtime(source)
+        if self.cache[:2] != (source, mtime):
+            locales = pd.read_excel(source, sheet_name=self.sheet_name)
+            self.cache = (source, mtime, locales)
+        return self.cache[2].copy()
+
+# Base link of pattern folders (sharepoint)
+HTML_LINK = ("https://kasikornbankgroup-my.sharepoint.com/personal/piti_p_kasikornbank_com/"
              "_layouts/15/onedrive.aspx?FolderCTID=0x012000FDB26412F17E3A4FB421F4C3C7F609F8&id="
              "%2Fpersonal%2Fpiti%5Fp%5Fkasikornbank%5Fcom%2FDocuments%2Fwork%2Finternal%5Ffraud"
              "%5Fmonitoring%2FFR%5FMonitoringCenter%2F")
-    color, font, size = "Black", "Tahoma", "13px"
+
+def HTMLTemplate(color="Black", font="Tahoma", size="13px"):
+    '''Template of outlook email (to be filled by CreateHTML)'''
     font0 = f'<p style=""font-family:{font}; color:{color}; font-size: {size};"">'
     font1 = f'<p style=""font-family:{font}; color:{color}; font-size: {size}; text-indent: 30px"">'
-    link += urllib.parse.quote(folder) + "&view=0"
     html  = [f"{font0}<b>Internal Fraud Monitoring Team</b> </p>",
-             f"{font1} &emsp; นำส่งไฟล์ Pattern รอบ {period} ตามรายละเอียดด้านล่าง</p>", 
-             f'{font1} &emsp; Pattern : <a href={link}>{folder}</a> </p>', 
-             f"{font1} &emsp; File name : {file}</p>", 
-             f"{font1} &emsp; Number of records : {rows:,.0f}</p>", 
+             f"{font1} &emsp; นำส่งไฟล์ Pattern รอบ {{period}} ตามรายละเอียดด้านล่าง</p>", 
+             f'{font1} &emsp; Pattern : <a href={{link}}>{{folder}}</a> </p>', 
+             f"{font1} &emsp; File name : {{file}}</p>", 
+             f"{font1} &emsp; Number of records : {{rows:,.0f}}</p>", 
              f"{font0} <b>Best Regards</b>,</p>",
              f"{font0} Fraud Analytics"]
-    return "<!DOCTYPE html><HTML><body>{}</body></HTML>".format("".join(html))
\ No newline at end of file
+    return "<!DOCTYPE html><HTML><body>{}</body></HTML>".format("".join(html))
+
+HTML_TEMPLATE = HTMLTemplate()
+
+# Quoted folder names (patterns repeat across workbooks)
+QuoteFolder = lru_cache(maxsize=256)(urllib.parse.quote)
+
+def CreateHTML(folder, file, period, rows):
+    '''Create html of outlook email'''
+    link = HTML_LINK + QuoteFolder(folder) + "&view=0"
+    return HTML_TEMPLATE.format(period=period, link=link, folder=folder, 
+                                file=file, rows=rows)
\ No newline at end of file
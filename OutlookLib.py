@@ -1,25 +1,53 @@
 '''
 Available methods are the followings:
 [1] ReadMail
-[2] SendMail
-[3] SaveAttachments
+[2] IterMail
+[3] SendMail
+[4] SendMails
+[5] SaveAttachments
 
 Authors: Danusorn Sitdhirasdr <danusorn.si@gmail.com>
 versionadded:: 30-07-2023
 
 '''
-import win32com.client, os, numpy as np
+import win32com.client, pythoncom, pywintypes, os, threading, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 from tqdm.notebook import tqdm_notebook
 import ipywidgets as widgets
 from IPython.display import display
+import logging
 
 __all__ = ["ReadMail",
+           "IterMail",
            "SendMail",
+           "SendMails",
            "SaveAttachments"]
 
+logger = logging.getLogger(__name__)
+
+# Generate (or load cached) early-bound wrappers of Outlook type library 
+# (Microsoft Outlook 16.0 Object Library) once at import. If unavailable, 
+# EnsureDispatch generates them from the running application instead.
+OUTLOOK_TYPELIB = ("{00062FFF-0000-0000-C000-000000000046}", 0, 9, 6)
+try: win32com.client.gencache.EnsureModule(*OUTLOOK_TYPELIB)
+except Exception: pass
+
+# Outlook application (early-bound) and resolved folders are cached 
+# per thread, as COM objects are apartment-threaded (STA).
+_LOCAL = threading.local()
+
+def _get_outlook():
+    '''Get (cached) Outlook application of current thread'''
+    outlook = getattr(_LOCAL, "outlook", None)
+    if outlook is None:
+        outlook = win32com.client.gencache.\
+        EnsureDispatch("Outlook.Application")
+        _LOCAL.outlook, _LOCAL.folders = outlook, None
+    return outlook
+
 def ReadMail(path, stop=None, start=None, days=100, sort=True):
-    
     '''
     Read and extract Microsoft Outlook mails from designated folder.
     
@@ -62,31 +90,45 @@ def ReadMail(path, stop=None, start=None, days=100, sort=True):
         - "ReceivedTime" : Date & time at which the item was received
         - "CreationTime" : Creation time
         - "SentOn"       : Date & time at which the item was sent
-        - "Attachments"  : Attached files.
+        - "Attachments"  : Attached files (LazyAttachments, read when 
+                           accessed), or None if there is no attachment.
+    
+    See Also
+    --------
+    IterMail : Yield the same mails one at a time.
     
     '''
-    # Initialize parameters
-    outlook = win32com.client.Dispatch("Outlook.Application")
-    outlook = outlook.GetNamespace("MAPI")
+    return dict(enumerate(IterMail(path, stop, start, days, sort)))
+
+def IterMail(path, stop=None, start=None, days=100, sort=True):
+    
+    '''
+    Same as ReadMail, except that mails are extracted and yielded one 
+    at a time (in the same order), instead of being kept in dictionary.
+    
+    Yields
+    ------
+    content : dict
+        Properties of mail (see ReadMail).
     
+    '''
     # Attributes (mailitem)
     keys = ["SenderName", "To", "CC", "Subject", "Body", 
             "HTMLBody", "ReceivedTime", "CreationTime", 
             "SentOn"]
  
     # Get subfolders
-    subfolders = path.split("\\")
-    folder = outlook.Folders[subfolders[0]]
-    for name in subfolders[1:]:
-        folder = folder.folders[name]
+    folder = _resolve_folder(tuple(path.split("\\")))
 
-    # Query by start and stop dates
+    # Query by start and stop dates. Restrict only compares up to 
+    # minutes, thus "start" is rounded down (as formatted) and "finish" 
+    # is rounded up to the next minute.
     start, finish = ValidateDate(stop, start, max(days,1))
-    dt0 = start  - timedelta(minutes=1)
+    dt0 = start
     dt1 = finish + timedelta(minutes=1)
     query = [f"[ReceivedTime] >= '{dt0:%d/%m/%Y %H:%M}'",
              f"[ReceivedTime] <= '{dt1:%d/%m/%Y %H:%M}'"]
-    items = folder.items.Restrict(" AND ".join(query))
+    items = folder.Items.Restrict(" AND ".join(query))
     items.Sort("[ReceivedTime]", sort)
     
     # Initialize widgets
@@ -95,13 +137,22 @@ def ReadMail(path, stop=None, start=None, days=100, sort=True):
     t.value = f" Number of emails : {items.Count:,.0f}"
 
     # Loop through all mail items
-    mails = dict()
     for item in tqdm_notebook(items):
         received = ToDatetime(item.ReceivedTime)
-        if (received>=start) & (received<=finish):
-            mails[len(mails)] = ExtractContent(item, keys)
-        
-    return mails
+        if start <= received <= finish:
+            yield ExtractContent(item, keys)
+
+def _resolve_folder(subfolders):
+    '''Get (cached) Outlook folder of current thread'''
+    outlook = _get_outlook()
+    folders = getattr(_LOCAL, "folders", None)
+    if folders is None: folders = _LOCAL.folders = dict()
+    if subfolders not in folders:
+        folder = outlook.GetNamespace("MAPI").Folders[subfolders[0]]
+        for name in subfolders[1:]:
+            folder = folder.Folders[name]
+        folders[subfolders] = folder
+    return folders[subfolders]
 
 def ExtractContent(item, keys):
     '''Extract content from mail'''
@@ -112,21 +163,47 @@ def ExtractContent(item, keys):
             content[key] = value.strftime("%d/%m/%Y %H:%M:%S")
         else: content[key] = value
         
-    # Add attached files
-    if item.Attachments.Count>0:
-        files = dict()
-        for a in item.Attachments:
-            try: files[a.FileName] = a
-            except: pass
-    else: files = None
-    content["Attachments"] = files 
+    # Add attached files (read when accessed)
+    count = item.Attachments.Count
+    content["Attachments"] = LazyAttachments(item, count) if count else None
     return content
 
+class LazyAttachments(Mapping):
+    
+    '''
+    Attached files of mail item i.e. {FileName: Attachment}. Outlook is 
+    only queried when it is accessed. len() uses the count of attachments
+    (if given), while other accesses read all attachments (once).
+    '''
+    def __init__(self, item, count=None):
+        self.item  = item
+        self.count = count
+        self.files = None
+    
+    def __load__(self):
+        if self.files is None:
+            self.files = dict()
+            for a in self.item.Attachments:
+                try: self.files[a.FileName] = a
+                except: pass
+        return self.files
+    
+    def __len__(self):
+        if self.files is not None: return len(self.files)
+        if self.count is None: self.count = self.item.Attachments.Count
+        return self.count
+    
+    def __iter__(self): 
+        return iter(self.__load__())
+    
+    def __getitem__(self, name): 
+        return self.__load__()[name]
+
 def ToDatetime(date):
-    '''Convert to datetime format'''
+    '''Convert to naive datetime (truncated to seconds)'''
     if isinstance(date, datetime):
-        format = "%d/%m/%Y %H:%M:%S"
-        return datetime.strptime(date.strftime(format),format)
+        return datetime(date.year, date.month, date.day, 
+                        date.hour, date.minute, date.second)
     else: return None
 
 def ValidateDate(stop, start=None, days=100):
@@ -171,25 +248,28 @@ def SendMail(htmlbody, recipients, cc=None, subject=None,
     
     '''
     # Initialize parameters
-    outlook = win32com.client.Dispatch("Outlook.Application")
-    mail = outlook.CreateItem(0x0)
+    mail = _get_outlook().CreateItem(0x0)
     
     # Add Subject
     if not isinstance(subject, str):
         mail.Subject = "No Subject"
     else: mail.Subject = subject
     
-    # Add "TO", and "CC" recipients
-    if isinstance(recipients, list): 
-        mail.To = ";".join(recipients)
-    if isinstance(cc, list): mail.CC = ";".join(cc)
+    # Add "TO" (olTo=1), and "CC" (olCC=2) recipients, and then 
+    # resolve them all at once.
+    for addrs, rtype in ((recipients,1), (cc,2)):
+        if isinstance(addrs, list):
+            for addr in addrs: 
+                if not isinstance(addr, str) or not addr.strip(): continue
+                mail.Recipients.Add(addr.strip()).Type = rtype
+    mail.Recipients.ResolveAll()
     mail.HTMLBody = htmlbody
     
-    # Attach files. 
+    # Attach files (those Outlook cannot add e.g. missing, are skipped). 
     if isinstance(attachments, list):
         for path in attachments:
-            if os.path.exists(path):
-                mail.Attachments.Add(path)
+            try: mail.Attachments.Add(path)
+            except pywintypes.com_error: pass
     
     # Add other attributes
     if isinstance(kwargs, dict):
@@ -200,6 +280,54 @@ def SendMail(htmlbody, recipients, cc=None, subject=None,
     if display: mail.Display()
     else: mail.Send()
 
+def SendMails(mails, max_workers=4):
+    
+    '''
+    Send multiple emails concurrently via Microsoft Outlook.
+    
+    Parameters
+    ----------
+    mails : list of dict
+        For each dictionary, it contains keyword arguments of SendMail 
+        e.g. {"htmlbody":"<html>...", "recipients":["xx@gmail.com"]}.
+    
+    max_workers : int, default=4
+        The maximum number of threads. Each thread initializes COM and
+        dispatches its own Outlook application, and sends its share of 
+        mails in order.
+    
+    Returns
+    -------
+    sent : list of bool
+        True if mail (same order as "mails") has been sent (or displayed) 
+        successfully, and False if it raises an error (error is logged 
+        with index of mail).
+    
+    '''
+    def send(chunk):
+        pythoncom.CoInitialize()
+        try:
+            flags = []
+            for n,kwargs in chunk:
+                try: SendMail(**kwargs)
+                except Exception as e:
+                    logger.error(f"Mail {n} cannot be sent out : {e!r}")
+                    flags.append(False)
+                else: flags.append(True)
+            return flags
+        finally:
+            _LOCAL.outlook, _LOCAL.folders = None, None
+            pythoncom.CoUninitialize()
+    
+    n_workers = max(min(max_workers, len(mails)), 1)
+    indexed = list(enumerate(mails))
+    chunks = [indexed[n::n_workers] for n in range(n_workers)]
+    sent = [False] * len(mails)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for n,flags in enumerate(executor.map(send, chunks)): 
+            sent[n::n_workers] = flags
+    return sent
+
 def SaveAttachments(items, folder=None):
     
     '''